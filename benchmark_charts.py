@@ -0,0 +1,211 @@
+"""Benchmarks the charts helpers against the plotly.express calls they replace.
+
+Builds each figure from synthetic frames shaped like the dashboard's
+aggregates and serializes it to JSON, as st.plotly_chart does. Prints the
+median time per figure for both paths.
+
+    python benchmark_charts.py --repeat 20
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objs as go
+import plotly.io as pio
+from plotly.subplots import make_subplots
+
+import charts
+
+MONTH_NAMES = [
+    "Jan",
+    "Feb",
+    "Mar",
+    "Apr",
+    "May",
+    "Jun",
+    "Jul",
+    "Aug",
+    "Sep",
+    "Oct",
+    "Nov",
+    "Dec",
+]
+
+
+def make_frames(seed=0):
+    """Synthetic frames with the sizes of the dashboard's aggregates."""
+    rng = np.random.default_rng(seed)
+    days = pd.date_range("2019-01-01", "2023-12-31", freq="D")
+    dispensers = [f"DISPENSER {i}" for i in range(6)]
+    doctors = ["FERNANDES", "CHEUNG", "WISE", "BOSMAN", "OLIVIER", "SMITH", "ASMAL"]
+    items = [f"ITEM {i}" for i in range(10)]
+    return {
+        "daily": pd.DataFrame(
+            {"Script Date": days, "gross_profit": rng.normal(5000, 1500, len(days))}
+        ),
+        "dispenser_days": pd.DataFrame(
+            {
+                "Script Date": np.repeat(days, len(dispensers)),
+                "Dispenser": np.tile(dispensers, len(days)),
+                "Sctno": rng.poisson(40, len(days) * len(dispensers)),
+            }
+        ),
+        "doctor_months": pd.DataFrame(
+            {
+                "Doctor": np.repeat(doctors, 12),
+                "Month": np.tile(MONTH_NAMES, len(doctors)),
+                "Sctno": rng.poisson(300, 12 * len(doctors)),
+            }
+        ),
+        "item_years": pd.DataFrame(
+            {
+                "Item Description": np.repeat(items, 4),
+                "Year": np.tile(["2020", "2021", "2022", "2023"], len(items)),
+                "Volume": rng.poisson(2000, 4 * len(items)),
+            }
+        ),
+        "retail": pd.DataFrame(
+            {
+                "Retail": rng.gamma(2, 300, 200_000),
+                "Year": rng.choice(["2019", "2020", "2021", "2022", "2023"], 200_000),
+            }
+        ),
+        "months": pd.DataFrame(
+            {
+                "Month": MONTH_NAMES,
+                "Sctno": rng.poisson(100, 12),
+                "Qty": rng.poisson(900, 12),
+            }
+        ),
+    }
+
+
+def px_dual_axis(frame):
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(
+        go.Scatter(x=frame["Month"], y=frame["Sctno"], name="Volume", mode="lines"),
+        secondary_y=False,
+    )
+    fig.add_trace(
+        go.Scatter(x=frame["Month"], y=frame["Qty"], name="Quantity", mode="lines"),
+        secondary_y=True,
+    )
+    fig.update_layout(title="Monthly Volume and Quantity")
+    fig.update_xaxes(title_text="Date")
+    fig.update_yaxes(title_text="Volume", secondary_y=False)
+    fig.update_yaxes(title_text="Quantity", secondary_y=True)
+    return fig
+
+
+def charts_dual_axis(frame):
+    return charts.dual_axis_lines(
+        [
+            ("Volume", frame["Month"], frame["Sctno"], False),
+            ("Quantity", frame["Month"], frame["Qty"], True),
+        ],
+        title="Monthly Volume and Quantity",
+        x_title="Date",
+        y_title="Volume",
+        secondary_y_title="Quantity",
+    )
+
+
+def cases(frames):
+    """(name, px builder, charts builder) for each benchmarked figure."""
+    return [
+        (
+            "line, daily",
+            lambda: px.line(frames["daily"], x="Script Date", y="gross_profit"),
+            lambda: charts.line(frames["daily"], x="Script Date", y="gross_profit"),
+        ),
+        (
+            "line, daily by dispenser",
+            lambda: px.line(
+                frames["dispenser_days"], x="Script Date", y="Sctno", color="Dispenser"
+            ),
+            lambda: charts.line(
+                frames["dispenser_days"], x="Script Date", y="Sctno", color="Dispenser"
+            ),
+        ),
+        (
+            "line, month by doctor",
+            lambda: px.line(
+                frames["doctor_months"],
+                x="Month",
+                y="Sctno",
+                color="Doctor",
+                category_orders={"Month": MONTH_NAMES},
+            ),
+            lambda: charts.line(
+                frames["doctor_months"],
+                x="Month",
+                y="Sctno",
+                color="Doctor",
+                category_orders={"Month": MONTH_NAMES},
+            ),
+        ),
+        (
+            "grouped bar",
+            lambda: px.bar(
+                frames["item_years"],
+                x="Item Description",
+                y="Volume",
+                color="Year",
+                barmode="group",
+            ),
+            lambda: charts.bar(
+                frames["item_years"],
+                x="Item Description",
+                y="Volume",
+                color="Year",
+                barmode="group",
+            ),
+        ),
+        (
+            "histogram by year",
+            lambda: px.histogram(
+                frames["retail"], x="Retail", nbins=1000, color="Year"
+            ),
+            lambda: charts.histogram(
+                frames["retail"], x="Retail", nbins=1000, color="Year"
+            ),
+        ),
+        (
+            "dual axis lines",
+            lambda: px_dual_axis(frames["months"]),
+            lambda: charts_dual_axis(frames["months"]),
+        ),
+    ]
+
+
+def median_ms(build, repeat):
+    """Median milliseconds to build a figure and serialize it to JSON."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pio.to_json(build())
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'figure':<26} {'px ms':>9} {'charts ms':>10} {'speedup':>8}")
+    for name, build_px, build_charts in cases(make_frames()):
+        # Warm up imports and plotly's validator caches before timing.
+        build_px()
+        build_charts()
+        px_ms = median_ms(build_px, args.repeat)
+        charts_ms = median_ms(build_charts, args.repeat)
+        print(f"{name:<26} {px_ms:>9.2f} {charts_ms:>10.2f} {px_ms / charts_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Lightweight figure construction for the dashboard.
+
+Each helper mirrors the plotly.express call it replaces. It builds plain
+trace and layout dicts from the NumPy arrays of a small aggregated frame and
+wraps them in a figure with property validation turned off. This skips
+plotly.express's dataframe-to-trace machinery.
+"""
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+import plotly.io as pio
+from plotly.colors import qualitative
+
+# px.line switches to WebGL traces above this many rows.
+WEBGL_THRESHOLD = 1000
+
+
+def figure(data, layout):
+    """Wraps trace and layout dicts in a figure without validating them."""
+    return go.Figure(data=data, layout=layout, _validate=False)
+
+
+def _colorway():
+    """Trace colors of the default template, resolved the way px does.
+
+    Read on every figure because Streamlit registers its own default
+    template, whose placeholder colors the frontend maps to the theme.
+    """
+    template = pio.templates[pio.templates.default or "plotly"]
+    return template.layout.colorway or qualitative.D3
+
+
+def _groups(frame, color):
+    """Splits `frame` by `color` in order of first appearance, like px does.
+
+    Returns `(name, rows)` pairs where `rows` indexes the group's positions.
+    """
+    if color is None:
+        return [(None, slice(None))]
+    codes, uniques = pd.factorize(frame[color], sort=False)
+    # A stable argsort groups the positions by code without a pass per group.
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return [
+        (name, order[bounds[i] : bounds[i + 1]]) for i, name in enumerate(uniques)
+    ]
+
+
+def _layout(title, x_title, y_title, color=None, category_orders=None, **extra):
+    layout = {
+        "title": {"text": title},
+        "xaxis": {"anchor": "y", "domain": [0.0, 1.0], "title": {"text": x_title}},
+        "yaxis": {"anchor": "x", "domain": [0.0, 1.0], "title": {"text": y_title}},
+        "legend": {"tracegroupgap": 0},
+        "margin": {"t": 60},
+        **extra,
+    }
+    if color is not None:
+        layout["legend"]["title"] = {"text": color}
+    for axis, column in (("xaxis", x_title), ("yaxis", y_title)):
+        if category_orders and column in category_orders:
+            layout[axis]["categoryorder"] = "array"
+            layout[axis]["categoryarray"] = list(category_orders[column])
+    return layout
+
+
+def _columns(frame, *columns):
+    """Each named column as a NumPy array, or None for a missing name."""
+    return [None if c is None else np.asarray(frame[c].to_numpy()) for c in columns]
+
+
+def _trace(x_values, y_values, x, y, color, name, rows, y_label=None):
+    """Fields every px trace shares, for the rows of one color group."""
+    trace = {
+        "x": x_values[rows],
+        "name": "" if name is None else str(name),
+        "legendgroup": "" if name is None else str(name),
+        "showlegend": name is not None,
+        "xaxis": "x",
+        "yaxis": "y",
+        "orientation": "v",
+    }
+    if y_values is not None:
+        trace["y"] = y_values[rows]
+    hover = [f"{x}=%{{x}}", f"{y_label or y}=%{{y}}"]
+    if name is not None:
+        hover.insert(0, f"{color}={name}")
+    trace["hovertemplate"] = "<br>".join(hover) + "<extra></extra>"
+    return trace
+
+
+def line(frame, x, y, color=None, title=None, category_orders=None):
+    """Equivalent of `px.line(frame, x=x, y=y, color=color, title=title)`."""
+    x_values, y_values = _columns(frame, x, y)
+    colorway = _colorway()
+    trace_type = "scattergl" if len(frame) > WEBGL_THRESHOLD else "scatter"
+    data = []
+    for index, (name, rows) in enumerate(_groups(frame, color)):
+        trace = _trace(x_values, y_values, x, y, color, name, rows)
+        trace.update(
+            type=trace_type,
+            mode="lines",
+            line={"color": colorway[index % len(colorway)], "dash": "solid"},
+            marker={"symbol": "circle"},
+        )
+        data.append(trace)
+    return figure(data, _layout(title, x, y, color, category_orders))
+
+
+def bar(frame, x, y, color=None, title=None, orientation="v", barmode="relative"):
+    """Equivalent of `px.bar(frame, x=x, y=y, color=color, ...)`."""
+    x_values, y_values = _columns(frame, x, y)
+    colorway = _colorway()
+    data = []
+    for index, (name, rows) in enumerate(_groups(frame, color)):
+        trace = _trace(x_values, y_values, x, y, color, name, rows)
+        trace.update(
+            type="bar",
+            orientation=orientation,
+            marker={
+                "color": colorway[index % len(colorway)],
+                "pattern": {"shape": ""},
+            },
+            alignmentgroup="True",
+            offsetgroup=trace["name"],
+            textposition="auto",
+        )
+        data.append(trace)
+    return figure(data, _layout(title, x, y, color, barmode=barmode))
+
+
+def histogram(frame, x, y=None, color=None, nbins=None, title=None):
+    """Equivalent of `px.histogram(frame, x=x, y=y, color=color, nbins=nbins)`."""
+    y_label = "count" if y is None else f"sum of {y}"
+    x_values, y_values = _columns(frame, x, y)
+    colorway = _colorway()
+    data = []
+    for index, (name, rows) in enumerate(_groups(frame, color)):
+        trace = _trace(x_values, y_values, x, y, color, name, rows, y_label=y_label)
+        trace.update(
+            type="histogram",
+            bingroup="x",
+            marker={
+                "color": colorway[index % len(colorway)],
+                "pattern": {"shape": ""},
+            },
+            alignmentgroup="True",
+            offsetgroup=trace["name"],
+        )
+        if y is not None:
+            trace["histfunc"] = "sum"
+        if nbins is not None:
+            trace["nbinsx"] = nbins
+        data.append(trace)
+    return figure(data, _layout(title, x, y_label, color, barmode="relative"))
+
+
+def box(columns, title=None):
+    """One box per `name: values` entry, like a go.Box per column."""
+    data = [
+        {"type": "box", "name": name, "y": np.asarray(values)}
+        for name, values in columns.items()
+    ]
+    return figure(data, {"title": {"text": title}})
+
+
+def dual_axis_lines(
+    lines, title, x_title, y_title, secondary_y_title, x_categories=None
+):
+    """Lines on a shared x axis with a secondary y axis.
+
+    Equivalent of `make_subplots(specs=[[{"secondary_y": True}]])` with one
+    go.Scatter per `(name, x, y, secondary_y)` entry of `lines`. Pass
+    `x_categories` to fix the x axis order when some lines lack categories.
+    """
+    data = [
+        {
+            "type": "scatter",
+            "mode": "lines",
+            "name": name,
+            "x": np.asarray(x),
+            "y": np.asarray(y),
+            "xaxis": "x",
+            "yaxis": "y2" if secondary_y else "y",
+        }
+        for name, x, y, secondary_y in lines
+    ]
+    layout = {
+        "title": {"text": title},
+        "xaxis": {"anchor": "y", "domain": [0.0, 0.94], "title": {"text": x_title}},
+        "yaxis": {"anchor": "x", "domain": [0.0, 1.0], "title": {"text": y_title}},
+        "yaxis2": {
+            "anchor": "x",
+            "overlaying": "y",
+            "side": "right",
+            "title": {"text": secondary_y_title},
+        },
+    }
+    if x_categories is not None:
+        layout["xaxis"]["categoryorder"] = "array"
+        layout["xaxis"]["categoryarray"] = list(x_categories)
+    return figure(data, layout)
@@ -1,9 +1,255 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objs as go
+import plotly.io as pio
 import hmac
-from plotly.subplots import make_subplots
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import charts
+import snapshot
+
+DATA_PATH = "anon_krmc_five_year_data_19_23.csv"
+QUARANTINE_PATH = "quarantine_krmc_five_year_data_19_23.csv"
+SCRIPT_DATE_FORMAT = "ISO8601"
+RETAIL_OUTLIER_THRESHOLD = 65000
+SNAPSHOT_ROOT = "snapshots"
+# Snapshots are keyed by the source hash and this version only. Bump it
+# whenever anything that shapes their contents changes, so that existing
+# snapshots are rebuilt: load_data's parsing and quarantine rules
+# (SCRIPT_DATE_FORMAT, RETAIL_OUTLIER_THRESHOLD, the negative and missing
+# value checks, and the quarantine counts kept in the manifest),
+# build_aggregates, and KRMC_DOCTORS.
+PIPELINE_VERSION = 2
+KRMC_DOCTORS = ["FERNANDES", "CHEUNG", "WISE", "BOSMAN", "OLIVIER", "SMITH", "ASMAL"]
+MONTH_NAMES = [
+    "Jan",
+    "Feb",
+    "Mar",
+    "Apr",
+    "May",
+    "Jun",
+    "Jul",
+    "Aug",
+    "Sep",
+    "Oct",
+    "Nov",
+    "Dec",
+]
+MONTH_DTYPE = pd.CategoricalDtype(MONTH_NAMES, ordered=True)
+# Total length of the serialized figures kept in the cache.
+FIGURE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+
+class FigureCache:
+    """LRU cache of serialized figures, shared by every session.
+
+    The cache is bounded by the total length of the payloads, since a single
+    figure can range from a few KB to several hundred KB.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        """Returns the cached figure for `key`, calling `build` on a miss."""
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if payload is not None:
+            # Payloads were serialized from built figures, so skip validation.
+            spec = json.loads(payload)
+            return charts.figure(spec["data"], spec["layout"])
+
+        fig = build()
+        payload = pio.to_json(fig)
+        if len(payload) > self.max_bytes:
+            return fig
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = payload
+                self._bytes += len(payload)
+            self._entries.move_to_end(key)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+        return fig
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache(FIGURE_CACHE_MAX_BYTES)
+
+
+def data_version(path):
+    """Identifies the source data by its size and modification time."""
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def cached_figure(name, params, build):
+    """Builds a figure once per data version and parameter combination."""
+    key = (DATA_VERSION, name) + tuple(params)
+    return get_figure_cache().get_or_build(key, build)
+
+
+def month_label(month):
+    """Labels integer months (1-12) as an ordered month categorical."""
+    return pd.Categorical.from_codes(np.asarray(month) - 1, dtype=MONTH_DTYPE)
+
+
+def period_start(period):
+    """Converts integer period keys (year * 12 + month) to month-start dates."""
+    period = np.asarray(period) - 1
+    return pd.to_datetime(
+        pd.DataFrame({"year": period // 12, "month": period % 12 + 1, "day": 1})
+    ).to_numpy()
+
+
+def load_data(path):
+    """Loads the pharmacy data and quarantines rows that fail validation.
+
+    Returns the clean rows and the number of rows per quarantine reason; a
+    row that fails several checks is counted under each.
+    """
+    df = pd.read_csv(path, low_memory=False, index_col=0)
+    script_date = pd.to_datetime(
+        df["Script Date"], format=SCRIPT_DATE_FORMAT, errors="coerce"
+    ).dt.normalize()
+
+    checks = {
+        "bad_script_date": script_date.isna(),
+        "negative_value": (df[["Retail", "Cost", "Qty"]] < 0).any(axis=1),
+        "missing_retail": df["Retail"].isna(),
+        "retail_outlier": df["Retail"] >= RETAIL_OUTLIER_THRESHOLD,
+    }
+    quarantined = np.logical_or.reduce(list(checks.values()))
+
+    df_quarantine = df[quarantined].copy()
+    df_quarantine["Quarantine Reason"] = np.select(
+        [mask[quarantined] for mask in checks.values()], list(checks)
+    )
+    df_quarantine.to_csv(QUARANTINE_PATH)
+
+    df = df[~quarantined].copy()
+    df["Script Date"] = script_date[~quarantined].to_numpy()
+    # Monthly views group and sort on these integers; month names are only
+    # applied when a figure is rendered.
+    df["Script Month"] = df["Script Date"].dt.month.astype("int8")
+    df["Script Period"] = df["Script Date"].dt.year * 12 + df["Script Month"]
+    quarantine_counts = {reason: int(mask.sum()) for reason, mask in checks.items()}
+    return df, quarantine_counts
+
+
+def check_ingest(df, quarantine_counts):
+    """Stops the app if ingest left no usable rows.
+
+    More bad dates than clean rows almost always means SCRIPT_DATE_FORMAT no
+    longer matches the source file, so stop rather than chart what is left.
+    """
+    if df.empty or quarantine_counts["bad_script_date"] > len(df):
+        st.error(
+            f"😕 Only {len(df):,} rows passed validation; see {QUARANTINE_PATH}. "
+            + ", ".join(
+                f"{reason.replace('_', ' ')}: {count:,}"
+                for reason, count in quarantine_counts.items()
+            )
+        )
+        st.stop()
+
+
+def build_aggregates(df):
+    """Derives every table the dashboard renders from the clean rows."""
+    df = df.assign(
+        gross_profit=df["Retail"] - df["Cost"], Year=df["Script Date"].dt.year
+    )
+    return {
+        "daily": df.groupby("Script Date")
+        .agg(
+            Cost=("Cost", "sum"),
+            Retail=("Retail", "sum"),
+            gross_profit=("gross_profit", "sum"),
+            Rows=("gross_profit", "count"),
+        )
+        .reset_index(),
+        # The price distribution is drawn from every row, so Year is stored
+        # ready to plot: strings, dictionary-encoded on disk.
+        "retail": df[["Retail"]].assign(
+            Year=df["Year"].astype(str).astype("category")
+        ),
+        "scripts": df.groupby("Sctno")[["Cost", "Retail", "gross_profit"]]
+        .sum()
+        .reset_index(),
+        "dispenser_days": df.drop_duplicates(subset=["Sctno"])
+        .groupby(["Script Date", "Dispenser"])["Sctno"]
+        .count()
+        .reset_index(),
+        "product_months": df.groupby(
+            ["Script Period", "Script Month", "Item Description", "Year"]
+        )
+        .agg(
+            Sctno=("Sctno", "count"),
+            Qty=("Qty", "sum"),
+            Retail=("Retail", "sum"),
+            Cost=("Cost", "sum"),
+        )
+        .reset_index(),
+        "medical_aid_items": df.groupby(["Medical Aid", "Item Description"])["Sctno"]
+        .count()
+        .reset_index(),
+        "doctor_days": df[df["Doctor"].isin(KRMC_DOCTORS)]
+        .groupby(["Doctor", "Script Date"])[["gross_profit"]]
+        .sum()
+        .reset_index(),
+        "doctor_item_months": df.groupby(
+            ["Doctor", "Script Period", "Script Month", "Item Description"]
+        )["Sctno"]
+        .count()
+        .reset_index(),
+    }
+
+
+@st.cache_resource
+def load_aggregates(path, version):
+    """Opens the aggregate snapshot for the source data, building it if needed.
+
+    `version` is only used to key the cache. The raw rows are only read when
+    no snapshot matches the source hash and PIPELINE_VERSION.
+    """
+    source = snapshot.cached_source_hash(SNAPSHOT_ROOT, path)
+    aggregates = snapshot.load_snapshot(SNAPSHOT_ROOT, source, PIPELINE_VERSION)
+    if aggregates is None:
+        df, quarantine_counts = load_data(path)
+        check_ingest(df, quarantine_counts)
+        aggregates = snapshot.save_snapshot(
+            SNAPSHOT_ROOT,
+            source,
+            PIPELINE_VERSION,
+            build_aggregates(df),
+            metadata={"quarantine_counts": quarantine_counts},
+        )
+    return aggregates
 
 
 def check_password():
@@ -45,48 +291,55 @@ This dashboard presents an exploratory data analysis (EDA) on KRMC's Pharmacy Da
 )
 
 # Load the data
-df = pd.read_csv(
-    "anon_krmc_five_year_data_19_23.csv",
-    low_memory=False,
-    index_col=0,
-)
-df["Script Date"] = pd.to_datetime(df["Script Date"]).dt.date
-df["Script Date"] = pd.to_datetime(df["Script Date"])
-df["Year"] = df["Script Date"].dt.year
+DATA_VERSION = data_version(DATA_PATH)
+aggregates = load_aggregates(DATA_PATH, DATA_VERSION)
+quarantine_counts = aggregates.metadata["quarantine_counts"]
 
 st.header("1. Financial Analysis")
 
 # Filtering data
-df = df[df["Retail"] < 65000]
-df_fa = df.copy()
+if sum(quarantine_counts.values()):
+    st.caption(
+        f"Rows quarantined to {QUARANTINE_PATH}: "
+        + ", ".join(
+            f"{reason.replace('_', ' ')}: {count:,}"
+            for reason, count in quarantine_counts.items()
+            if count
+        )
+    )
+df_fa_gp = aggregates["daily"]
 
-total_retail_sales = df[df['Year']==2023]["Retail"].sum()
-total_cost_sales = df[df['Year']==2023]["Cost"].sum()
+df_fa_gp_2023 = df_fa_gp[df_fa_gp["Script Date"].dt.year == 2023]
+total_retail_sales = df_fa_gp_2023["Retail"].sum()
+total_cost_sales = df_fa_gp_2023["Cost"].sum()
 st.write(f"Sum of all retail sales: R{total_retail_sales:,.2f} in 2023")
 st.write(f"Sum of cost of sales: R{total_cost_sales:,.2f} in 2023")
 st.write(f"Total Gross Profit: R{total_retail_sales - total_cost_sales:,.2f} in 2023")
 # Updated Distribution of Retail Prices
-df_fa['Year'] = df_fa['Year'].astype(str)
-fig2 = px.histogram(
-    df_fa, x="Retail", nbins=1000, title="Distribution of Retail Prices after Filtering", color="Year"
-)
+
+
+def build_retail_distribution():
+    # One row per clean raw row, so read the shared frame instead of copying it.
+    df_fa = aggregates.shared("retail")
+    return charts.histogram(
+        df_fa, x="Retail", nbins=1000, title="Distribution of Retail Prices after Filtering", color="Year"
+    )
+
+
+fig2 = cached_figure("retail_distribution", (), build_retail_distribution)
 st.plotly_chart(fig2, use_container_width=True)
 
 # Gross profit over the period
-gross_profit = df_fa["Retail"].sum() - df_fa["Cost"].sum()
+gross_profit = df_fa_gp["Retail"].sum() - df_fa_gp["Cost"].sum()
 period = (
-    df_fa["Script Date"].min().strftime("%d-%b-%Y")
+    df_fa_gp["Script Date"].min().strftime("%d-%b-%Y")
     + " to "
-    + df_fa["Script Date"].max().strftime("%d-%b-%Y")
+    + df_fa_gp["Script Date"].max().strftime("%d-%b-%Y")
 )
 st.write(f"Gross profit over the period {period}: R{gross_profit:,.2f}")
 
 # Gross profit over time
-df_fa["gross_profit"] = df_fa["Retail"] - df_fa["Cost"]
-df_fa_gp = (
-    df_fa.groupby("Script Date")[["Cost", "Retail", "gross_profit"]].sum().reset_index()
-)
-fig3 = px.histogram(
+fig3 = charts.histogram(
     df_fa_gp, x="Script Date", y="gross_profit", title="Gross Profit over Time", nbins=60
 )
 st.plotly_chart(fig3, use_container_width=True)
@@ -98,21 +351,36 @@ rolling_window = st.number_input(
     value=14,
     step=1,
 )
-df_fa_gp["gross_profit_moving_avg"] = (
-    df_fa_gp["gross_profit"].rolling(window=rolling_window).mean()
-)
-fig = px.line(
-    df_fa_gp,
-    x="Script Date",
-    y="gross_profit_moving_avg",
-    title=f"Gross Profit Moving Average over Time with {rolling_window} days window",
+
+
+def build_gross_profit_moving_avg():
+    temp_df = df_fa_gp[["Script Date", "gross_profit"]].copy()
+    temp_df["gross_profit_moving_avg"] = (
+        temp_df["gross_profit"].rolling(window=rolling_window).mean()
+    )
+    return charts.line(
+        temp_df,
+        x="Script Date",
+        y="gross_profit_moving_avg",
+        title=f"Gross Profit Moving Average over Time with {rolling_window} days window",
+    )
+
+
+fig = cached_figure(
+    "gross_profit_moving_avg", (rolling_window,), build_gross_profit_moving_avg
 )
 st.plotly_chart(fig, use_container_width=True)
 
 # Average profit by month
-df_fa["Month"] = df_fa["Script Date"].dt.month
-df_fa_gp_month = df_fa.groupby("Month")[["gross_profit"]].mean().reset_index()
-fig5 = px.bar(
+df_fa_gp["Month"] = df_fa_gp["Script Date"].dt.month
+df_fa_gp_month = (
+    df_fa_gp.groupby("Month")[["gross_profit", "Rows"]].sum().reset_index()
+)
+# Average over rows, not days, so weight each day by its row count.
+df_fa_gp_month["gross_profit"] = (
+    df_fa_gp_month["gross_profit"] / df_fa_gp_month["Rows"]
+)
+fig5 = charts.bar(
     df_fa_gp_month, x="Month", y="gross_profit", title="Average Profit by Month"
 )
 st.plotly_chart(fig5, use_container_width=True)
@@ -122,26 +390,20 @@ st.plotly_chart(fig5, use_container_width=True)
 # df_fa_s_fa = df_fa.groupby('Sctno')[['Retail', 'Cost', 'gross_profit']].sum().reset_index()
 # fig4 = px.bar(df_fa_s_fa, x='Sctno', y='gross_profit', title='Gross Profit by Sector')
 # st.plotly_chart(fig4)
-df_fa["Sctno"] = df_fa["Sctno"].astype("str")
-df_fa_s_fa = (
-    df_fa.groupby("Sctno")[["Cost", "Retail", "gross_profit"]].sum().reset_index()
-)
-fig = go.Figure()
-fig.add_trace(go.Box(y=df_fa_s_fa["Cost"], name="Cost"))
-fig.add_trace(go.Box(y=df_fa_s_fa["Retail"], name="Retail"))
-fig.add_trace(go.Box(y=df_fa_s_fa["gross_profit"], name="Gross Profit"))
-fig.update_layout(title="Box and Whisker Plot of Cost, Retail and Gross Profit")
+df_fa_s_fa = aggregates["scripts"]
+fig = charts.box(
+    {
+        "Cost": df_fa_s_fa["Cost"],
+        "Retail": df_fa_s_fa["Retail"],
+        "Gross Profit": df_fa_s_fa["gross_profit"],
+    },
+    title="Box and Whisker Plot of Cost, Retail and Gross Profit",
+)
 st.plotly_chart(fig, use_container_width=True)
 
 st.header("2. Operational Analysis")
 
-df_disp = (
-    df.drop_duplicates(subset=["Sctno"])
-    .groupby(["Script Date", "Dispenser"])["Sctno"]
-    .count()
-    .reset_index()
-)
-df_disp["Script Date"] = pd.to_datetime(df_disp["Script Date"]).dt.date
+df_disp = aggregates["dispenser_days"]
 # if there are days missing for a dispenser, fill with 0
 df_disp_all_days = (
     df_disp.set_index(["Script Date", "Dispenser"])
@@ -151,7 +413,7 @@ df_disp_all_days = (
     .reset_index()
 )
 # line plot with a line for each dispenser
-fig = px.line(
+fig = charts.line(
     df_disp_all_days,
     x="Script Date",
     y="Sctno",
@@ -167,39 +429,48 @@ disp_roll_window = st.number_input(
     value=30,
     step=1,
 )
-df_disp_all_days["Sctno_moving_avg"] = df_disp_all_days.groupby("Dispenser")[
-    "Sctno"
-].transform(lambda x: x.rolling(window=disp_roll_window).mean())
-fig = px.line(
-    df_disp_all_days,
-    x="Script Date",
-    y="Sctno_moving_avg",
-    color="Dispenser",
-    title=f"Scripts Moving Average over Time with {disp_roll_window} days window",
+
+
+def build_scripts_moving_avg():
+    temp_df = df_disp_all_days.copy()
+    temp_df["Sctno_moving_avg"] = temp_df.groupby("Dispenser")["Sctno"].transform(
+        lambda x: x.rolling(window=disp_roll_window).mean()
+    )
+    return charts.line(
+        temp_df,
+        x="Script Date",
+        y="Sctno_moving_avg",
+        color="Dispenser",
+        title=f"Scripts Moving Average over Time with {disp_roll_window} days window",
+    )
+
+
+fig = cached_figure(
+    "scripts_moving_avg", (disp_roll_window,), build_scripts_moving_avg
 )
 st.plotly_chart(fig, use_container_width=True)
 
 df_disp_stats = df_disp.groupby("Dispenser")["Sctno"].describe().reset_index()
 df_disp_stats["mean_of_means"] = df_disp_stats["mean"].mean()
-fig = px.bar(
+fig = charts.bar(
     df_disp_stats,
     x="Dispenser",
     y="count",
     title="Number of days active at KRMC Dispensary",
 )
 st.plotly_chart(fig, use_container_width=True)
-fig = px.bar(
+fig = charts.bar(
     df_disp_stats, x="Dispenser", y="mean", title="Mean Scripts per Day per Dispenser"
 )
 fig.add_trace(
-    go.Scatter(
-        x=df_disp_stats["Dispenser"],
-        y=df_disp_stats["mean_of_means"],
-        name="Mean for All",
-    )
+    {
+        "type": "scatter",
+        "x": df_disp_stats["Dispenser"].to_numpy(),
+        "y": df_disp_stats["mean_of_means"].to_numpy(),
+        "name": "Mean for All",
+    }
 )
 st.plotly_chart(fig, use_container_width=True)
-df_disp["Script Date"] = pd.to_datetime(df_disp["Script Date"]).dt.date
 
 
 def calculate_hours_open(row):
@@ -222,7 +493,7 @@ df_disp["no_of_hours_open"] = df_disp.apply(calculate_hours_open, axis=1)
 df_disp["rate_of_scripts"] = df_disp["Sctno"] / df_disp["no_of_hours_open"]
 df_disp = df_disp[df_disp["no_of_hours_open"] != 0]
 df_disp_sr_mean = df_disp.groupby("Dispenser")["rate_of_scripts"].mean().reset_index()
-fig = px.bar(
+fig = charts.bar(
     df_disp_sr_mean,
     x="Dispenser",
     y="rate_of_scripts",
@@ -231,43 +502,27 @@ fig = px.bar(
 st.plotly_chart(fig, use_container_width=True)
 
 st.header("3. Product Analysis")
-df["Year"] = df["Year"].astype(str)
-df_product_sales = (
-    df.groupby(["Item Description", "Year"])[["Retail", "Cost"]].sum().reset_index()
-)
-df_product_volume = (
-    df.groupby(["Item Description", "Year"])["Sctno"]
-    .count()
-    .reset_index()
-    .rename(columns={"Sctno": "Volume"})
-)
-df_product_sales_volume = pd.merge(
-    df_product_sales, df_product_volume, on=["Item Description", "Year"]
-)
-
-df_product_sales_exc_year = (
-    df.groupby(["Item Description"])[["Retail", "Cost"]].sum().reset_index()
-)
-df_product_volume_exc_year = (
-    df.groupby(["Item Description"])["Sctno"]
-    .count()
+df_product_monthly_volume_quantity_year = aggregates["product_months"]
+df_product_monthly_volume_quantity_year["Year"] = df_product_monthly_volume_quantity_year[
+    "Year"
+].astype(str)
+df_product_sales_volume = (
+    df_product_monthly_volume_quantity_year.groupby(["Item Description", "Year"])
+    .agg(Retail=("Retail", "sum"), Cost=("Cost", "sum"), Volume=("Sctno", "sum"))
     .reset_index()
-    .rename(columns={"Sctno": "Volume"})
 )
-df_product_sales_volume_exc_year = pd.merge(
-    df_product_sales, df_product_volume, on=["Item Description"]
-)
-top_10_products = (
-    df_product_sales_volume_exc_year.sort_values(by="Volume", ascending=False)
-    .drop_duplicates("Item Description", keep="first")
-    .head(10)["Item Description"]
+# Products are ranked by their best single year.
+products = (
+    df_product_sales_volume.sort_values(by="Volume", ascending=False)
+    .drop_duplicates("Item Description", keep="first")["Item Description"]
     .tolist()
 )
+top_10_products = products[:10]
 
 df_product_sales_volume_top_10 = df_product_sales_volume[df_product_sales_volume["Item Description"].isin(top_10_products)]
 # make a seperate line for each year
 
-fig = px.bar(
+fig = charts.bar(
     df_product_sales_volume_top_10,
     y="Volume",
     x="Item Description",
@@ -277,20 +532,10 @@ fig = px.bar(
 )
 st.plotly_chart(fig, use_container_width=True)
 
-df["Script Date Month"] = (
-    pd.to_datetime(df["Script Date"]).dt.to_period("M").astype(str)
-)
-products = (
-    df_product_sales_volume.sort_values(by="Volume", ascending=False)
-    .drop_duplicates("Item Description", keep="first")["Item Description"]
-    .tolist()
-)
-df_product_monthly_volume = (
-    df.groupby(["Script Date Month", "Item Description"])["Sctno"].count().reset_index()
-)
-
 df_products_gross_profit = (
-    df.groupby("Item Description")[["Retail", "Cost"]].sum().reset_index()
+    df_product_sales_volume.groupby("Item Description")[["Retail", "Cost"]]
+    .sum()
+    .reset_index()
 )
 df_products_gross_profit["Gross Profit"] = (
     df_products_gross_profit["Retail"] - df_products_gross_profit["Cost"]
@@ -298,7 +543,7 @@ df_products_gross_profit["Gross Profit"] = (
 df_products_gross_profit_top_10 = df_products_gross_profit.sort_values(
     by="Gross Profit", ascending=False
 ).head(10)
-fig = px.bar(
+fig = charts.bar(
     df_products_gross_profit_top_10,
     y="Gross Profit",
     x="Item Description",
@@ -307,205 +552,95 @@ fig = px.bar(
 )
 st.plotly_chart(fig, use_container_width=True)
 item = st.selectbox("Select Product", products)
-# for item in top_10_products:
-temp_df = df_product_monthly_volume[
-    df_product_monthly_volume["Item Description"] == item
-]
-fig = px.line(
-    temp_df, x="Script Date Month", y="Sctno", title=f"Monthly Volume for {item}"
-)
-st.plotly_chart(fig, use_container_width=True)
 
 
-df_product_monthly_volume["Script Date Month"] = pd.to_datetime(
-    df_product_monthly_volume["Script Date Month"]
-)
-df_product_monthly_volume["Month"] = df_product_monthly_volume[
-    "Script Date Month"
-].dt.month
-df_product_only_monthly_volume = (
-    df_product_monthly_volume.groupby(["Month", "Item Description"])["Sctno"]
-    .mean()
-    .reset_index()
-)
-df_product_only_monthly_volume["Month"] = df_product_only_monthly_volume[
-    "Month"
-].replace(
-    {
-        1: "Jan",
-        2: "Feb",
-        3: "Mar",
-        4: "Apr",
-        5: "May",
-        6: "Jun",
-        7: "Jul",
-        8: "Aug",
-        9: "Sep",
-        10: "Oct",
-        11: "Nov",
-        12: "Dec",
-    }
-)
-df_product_monthly_qty = (
-    df.groupby(["Script Date Month", "Item Description"])["Qty"].sum().reset_index()
-)
-df_product_monthly_qty["Script Date Month"] = pd.to_datetime(
-    df_product_monthly_qty["Script Date Month"]
-)
-df_product_monthly_qty["Month"] = df_product_monthly_qty["Script Date Month"].dt.month
-df_product_only_monthly_qty = (
-    df_product_monthly_qty.groupby(["Month", "Item Description"])["Qty"]
-    .mean()
-    .reset_index()
-)
-df_product_only_monthly_qty["Month"] = df_product_only_monthly_qty["Month"].replace(
-    {
-        1: "Jan",
-        2: "Feb",
-        3: "Mar",
-        4: "Apr",
-        5: "May",
-        6: "Jun",
-        7: "Jul",
-        8: "Aug",
-        9: "Sep",
-        10: "Oct",
-        11: "Nov",
-        12: "Dec",
-    }
-)
+# for item in top_10_products:
+def build_product_monthly_volume():
+    temp_df = df_product_monthly_volume_quantity_year[
+        df_product_monthly_volume_quantity_year["Item Description"] == item
+    ].sort_values(by="Script Period")
+    temp_df["Script Date Month"] = period_start(temp_df["Script Period"])
+    return charts.line(
+        temp_df, x="Script Date Month", y="Sctno", title=f"Monthly Volume for {item}"
+    )
 
-df_product_monthly_volume_quantity = df_product_monthly_volume.merge(
-    df_product_monthly_qty, on=["Month", "Item Description", "Script Date Month"]
-)
 
-temp_df = df_product_monthly_volume_quantity[
-    df_product_monthly_volume_quantity["Item Description"] == item
-]
-temp_df = temp_df[["Month", "Sctno", "Qty"]].groupby("Month").mean().reset_index()
-
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-fig.add_trace(
-    go.Scatter(x=temp_df["Month"], y=temp_df["Sctno"], name="Volume", mode="lines"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=temp_df["Month"], y=temp_df["Qty"], name="Quantity", mode="lines"),
-    secondary_y=True,
-)
-fig.update_layout(title=f"Monthly Volume and Quantity for Product {item}")
-fig.update_xaxes(title_text="Date")
-fig.update_yaxes(title_text="Volume", secondary_y=False)
-fig.update_yaxes(title_text="Quantity", secondary_y=True)
+fig = cached_figure("product_monthly_volume", (item,), build_product_monthly_volume)
 st.plotly_chart(fig, use_container_width=True)
 
 
-df_product_monthly_volume_year = (
-    df.groupby(["Script Date Month", "Item Description", "Year"])["Sctno"]
-    .count()
-    .reset_index()
-)
-df_product_monthly_volume_year["Month"] = pd.to_datetime(
-    df_product_monthly_volume_year["Script Date Month"]
-).dt.month
-df_product_monthly_volume_year = df_product_monthly_volume_year.sort_values(
-    by=["Year", "Month"]
-)
-df_product_monthly_volume_year["Month"] = df_product_monthly_volume_year[
-    "Month"
-].replace(
-    {
-        1: "Jan",
-        2: "Feb",
-        3: "Mar",
-        4: "Apr",
-        5: "May",
-        6: "Jun",
-        7: "Jul",
-        8: "Aug",
-        9: "Sep",
-        10: "Oct",
-        11: "Nov",
-        12: "Dec",
-    }
-)
+def build_product_monthly_volume_quantity():
+    temp_df = df_product_monthly_volume_quantity_year[
+        df_product_monthly_volume_quantity_year["Item Description"] == item
+    ]
+    temp_df = (
+        temp_df[["Script Month", "Sctno", "Qty"]]
+        .groupby("Script Month")
+        .mean()
+        .reset_index()
+    )
+    month = month_label(temp_df["Script Month"])
+    return charts.dual_axis_lines(
+        [
+            ("Volume", month, temp_df["Sctno"], False),
+            ("Quantity", month, temp_df["Qty"], True),
+        ],
+        title=f"Monthly Volume and Quantity for Product {item}",
+        x_title="Date",
+        y_title="Volume",
+        secondary_y_title="Quantity",
+        x_categories=MONTH_NAMES,
+    )
 
-df_product_monthly_qty_year = (
-    df.groupby(["Script Date Month", "Item Description", "Year"])["Qty"]
-    .sum()
-    .reset_index()
-)
-df_product_monthly_qty_year["Month"] = pd.to_datetime(
-    df_product_monthly_qty_year["Script Date Month"]
-).dt.month
-df_product_monthly_qty_year = df_product_monthly_qty_year.sort_values(
-    by=["Year", "Month"]
-)
-df_product_monthly_qty_year["Month"] = df_product_monthly_qty_year["Month"].replace(
-    {
-        1: "Jan",
-        2: "Feb",
-        3: "Mar",
-        4: "Apr",
-        5: "May",
-        6: "Jun",
-        7: "Jul",
-        8: "Aug",
-        9: "Sep",
-        10: "Oct",
-        11: "Nov",
-        12: "Dec",
-    }
+
+fig = cached_figure(
+    "product_monthly_volume_quantity", (item,), build_product_monthly_volume_quantity
 )
+st.plotly_chart(fig, use_container_width=True)
+
 
 years_to_compare = st.multiselect(
     f"Select Years to Compare for {item}",
     ["2020", "2021", "2022", "2023"],
     ["2022", "2023"],
 )
-df_product_monthly_volume_quantity_year = df_product_monthly_volume_year.merge(
-    df_product_monthly_qty_year,
-    on=["Month", "Item Description", "Script Date Month", "Year"],
-)
-temp_df = df_product_monthly_volume_quantity_year[
-    df_product_monthly_volume_quantity_year["Item Description"] == item
-]
-temp_df = (
-    temp_df[["Month", "Sctno", "Qty", "Year"]]
-    .groupby(["Month", "Year"])
-    .mean()
-    .reset_index()
-)
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-for year in years_to_compare:
-    temp_df_year = temp_df[temp_df["Year"] == year]
-    fig.add_trace(
-        go.Scatter(
-            x=temp_df_year["Month"],
-            y=temp_df_year["Sctno"],
-            name=f"Volume {year}",
-            mode="lines",
-        ),
-        secondary_y=False,
+
+
+def build_product_monthly_volume_quantity_year():
+    temp_df = df_product_monthly_volume_quantity_year[
+        df_product_monthly_volume_quantity_year["Item Description"] == item
+    ]
+    temp_df = (
+        temp_df[["Script Month", "Sctno", "Qty", "Year"]]
+        .groupby(["Year", "Script Month"])
+        .mean()
+        .reset_index()
     )
-    fig.add_trace(
-        go.Scatter(
-            x=temp_df_year["Month"],
-            y=temp_df_year["Qty"],
-            name=f"Quantity {year}",
-            mode="lines",
-        ),
-        secondary_y=True,
+    lines = []
+    for year in years_to_compare:
+        temp_df_year = temp_df[temp_df["Year"] == year]
+        month = month_label(temp_df_year["Script Month"])
+        lines.append((f"Volume {year}", month, temp_df_year["Sctno"], False))
+        lines.append((f"Quantity {year}", month, temp_df_year["Qty"], True))
+    return charts.dual_axis_lines(
+        lines,
+        title=f"Monthly Volume and Quantity for Product {item} by Year",
+        x_title="Date",
+        y_title="Volume",
+        secondary_y_title="Quantity",
+        x_categories=MONTH_NAMES,
     )
-fig.update_layout(title=f"Monthly Volume and Quantity for Product {item} by Year")
-fig.update_xaxes(title_text="Date")
-fig.update_yaxes(title_text="Volume", secondary_y=False)
-fig.update_yaxes(title_text="Quantity", secondary_y=True)
-st.plotly_chart(fig, use_container_width=True)
 
-df_product_medical_aid = (
-    df.groupby(["Medical Aid", "Item Description"])["Sctno"].count().reset_index()
+
+# The trace order follows the selection order, so it is part of the key.
+fig = cached_figure(
+    "product_monthly_volume_quantity_year",
+    (item, tuple(years_to_compare)),
+    build_product_monthly_volume_quantity_year,
 )
+st.plotly_chart(fig, use_container_width=True)
+
+df_product_medical_aid = aggregates["medical_aid_items"]
 medical_aids = (
     df_product_medical_aid.groupby("Medical Aid")["Sctno"]
     .sum()
@@ -513,27 +648,36 @@ medical_aids = (
     .index.tolist()
 )
 medical_aid = st.selectbox("Select Medical Aid", medical_aids)
-temp_df = df_product_medical_aid[df_product_medical_aid["Medical Aid"] == medical_aid]
-temp_top_5_products = (
-    temp_df.groupby("Item Description")["Sctno"]
-    .sum()
-    .sort_values(ascending=False)
-    .head(5)
-    .reset_index()
-)
-fig = px.bar(
-    temp_top_5_products,
-    x="Sctno",
-    y="Item Description",
-    title=f"Top 5 Products for {medical_aid} Medical Aid",
-)
+
+
+def build_medical_aid_top_5():
+    temp_df = df_product_medical_aid[
+        df_product_medical_aid["Medical Aid"] == medical_aid
+    ]
+    temp_top_5_products = (
+        temp_df.groupby("Item Description")["Sctno"]
+        .sum()
+        .sort_values(ascending=False)
+        .head(5)
+        .reset_index()
+    )
+    return charts.bar(
+        temp_top_5_products,
+        x="Sctno",
+        y="Item Description",
+        title=f"Top 5 Products for {medical_aid} Medical Aid",
+        orientation="h",
+    )
+
+
+fig = cached_figure("medical_aid_top_5", (medical_aid,), build_medical_aid_top_5)
 st.plotly_chart(fig, use_container_width=True)
 
 
 st.header("4. Doctor Analysis")
 
 # # Gross profit by doctor
-krmc_doctors = ["FERNANDES", "CHEUNG", "WISE", "BOSMAN", "OLIVIER", "SMITH", "ASMAL"]
+krmc_doctors = KRMC_DOCTORS
 
 dr_gp_rolling_window = st.number_input(
     "Enter the rolling window for moving average for Gross Profit by Doctor",
@@ -542,32 +686,42 @@ dr_gp_rolling_window = st.number_input(
     value=14,
     step=1,
 )
-df_int_docs = df_fa[df_fa["Doctor"].isin(krmc_doctors)]
-df_int_docs_gp = (
-    df_int_docs.groupby(["Doctor", "Script Date"])[["gross_profit"]].sum().reset_index()
-)
-df_int_docs_gp["gross_profit_moving_avg"] = df_int_docs_gp.groupby("Doctor")[
-    "gross_profit"
-].transform(lambda x: x.rolling(window=dr_gp_rolling_window).mean())
-fig6 = px.line(
-    df_int_docs_gp,
-    x="Script Date",
-    y="gross_profit_moving_avg",
-    color="Doctor",
-    title=f"Gross Profit by KRMC Doctor over Time with {dr_gp_rolling_window} days window",
+
+
+def build_doctor_gross_profit_moving_avg():
+    df_int_docs_gp = aggregates["doctor_days"]
+    df_int_docs_gp["gross_profit_moving_avg"] = df_int_docs_gp.groupby("Doctor")[
+        "gross_profit"
+    ].transform(lambda x: x.rolling(window=dr_gp_rolling_window).mean())
+    return charts.line(
+        df_int_docs_gp,
+        x="Script Date",
+        y="gross_profit_moving_avg",
+        color="Doctor",
+        title=f"Gross Profit by KRMC Doctor over Time with {dr_gp_rolling_window} days window",
+    )
+
+
+fig6 = cached_figure(
+    "doctor_gross_profit_moving_avg",
+    (dr_gp_rolling_window,),
+    build_doctor_gross_profit_moving_avg,
 )
 st.plotly_chart(fig6, use_container_width=True)
 
-df_krmc_doctors = df[df["Doctor"].isin(krmc_doctors)]
-df_krmc_doctors_monthly_volume = (
-    df_krmc_doctors.groupby(["Script Date Month", "Doctor"])["Sctno"]
-    .count()
+df_doctor_item_months = aggregates["doctor_item_months"]
+df_doctor_monthly_volume = (
+    df_doctor_item_months.groupby(["Doctor", "Script Period", "Script Month"])["Sctno"]
+    .sum()
     .reset_index()
 )
-df_krmc_doctors_monthly_volume["Script Date Month"] = pd.to_datetime(
-    df_krmc_doctors_monthly_volume["Script Date Month"]
+df_krmc_doctors_monthly_volume = df_doctor_monthly_volume[
+    df_doctor_monthly_volume["Doctor"].isin(krmc_doctors)
+].copy()
+df_krmc_doctors_monthly_volume["Script Date Month"] = period_start(
+    df_krmc_doctors_monthly_volume["Script Period"]
 )
-fig = px.line(
+fig = charts.line(
     df_krmc_doctors_monthly_volume,
     x="Script Date Month",
     y="Sctno",
@@ -576,53 +730,36 @@ fig = px.line(
 )
 st.plotly_chart(fig, use_container_width=True)
 
-df_krmc_doctors_monthly_volume["Month"] = df_krmc_doctors_monthly_volume[
-    "Script Date Month"
-].dt.month
 df_krmc_doctors_monthly_volume_only = (
-    df_krmc_doctors_monthly_volume.groupby(["Month", "Doctor"])["Sctno"]
+    df_krmc_doctors_monthly_volume.groupby(["Doctor", "Script Month"])["Sctno"]
     .mean()
     .reset_index()
 )
-df_krmc_doctors_monthly_volume_only["Month"] = df_krmc_doctors_monthly_volume_only[
-    "Month"
-].replace(
-    {
-        1: "Jan",
-        2: "Feb",
-        3: "Mar",
-        4: "Apr",
-        5: "May",
-        6: "Jun",
-        7: "Jul",
-        8: "Aug",
-        9: "Sep",
-        10: "Oct",
-        11: "Nov",
-        12: "Dec",
-    }
+df_krmc_doctors_monthly_volume_only["Month"] = month_label(
+    df_krmc_doctors_monthly_volume_only["Script Month"]
 )
-fig = px.line(
+fig = charts.line(
     df_krmc_doctors_monthly_volume_only,
     x="Month",
     y="Sctno",
     color="Doctor",
+    category_orders={"Month": MONTH_NAMES},
     title="Monthly Script Volumes for KRMC Doctors",
 )
 st.plotly_chart(fig, use_container_width=True)
 
 
-external_doctors = df[~df["Doctor"].isin(krmc_doctors)]["Doctor"].unique().tolist()
-external_doctors.remove("KRMC DISPENSARY")
-df_external_doctors = df[df["Doctor"].isin(external_doctors)]
-df_external_doctors_monthly_volume = (
-    df_external_doctors.groupby(["Script Date Month", "Doctor"])["Sctno"]
-    .count()
-    .reset_index()
-)
-df_external_doctors_monthly_volume["Script Date Month"] = pd.to_datetime(
-    df_external_doctors_monthly_volume["Script Date Month"]
+external_doctors = (
+    df_doctor_monthly_volume[~df_doctor_monthly_volume["Doctor"].isin(krmc_doctors)][
+        "Doctor"
+    ]
+    .unique()
+    .tolist()
 )
+external_doctors.remove("KRMC DISPENSARY")
+df_external_doctors_monthly_volume = df_doctor_monthly_volume[
+    df_doctor_monthly_volume["Doctor"].isin(external_doctors)
+]
 top_5_external_doctors = (
     df_external_doctors_monthly_volume.groupby("Doctor")["Sctno"]
     .sum()
@@ -632,8 +769,11 @@ top_5_external_doctors = (
 )
 df_external_doctors_monthly_volume = df_external_doctors_monthly_volume[
     df_external_doctors_monthly_volume["Doctor"].isin(top_5_external_doctors)
-]
-fig = px.line(
+].copy()
+df_external_doctors_monthly_volume["Script Date Month"] = period_start(
+    df_external_doctors_monthly_volume["Script Period"]
+)
+fig = charts.line(
     df_external_doctors_monthly_volume,
     x="Script Date Month",
     y="Sctno",
@@ -643,153 +783,88 @@ fig = px.line(
 st.plotly_chart(fig, use_container_width=True)
 
 df_external_doctors_monthly_volume_2023 = df_external_doctors_monthly_volume[
-    df_external_doctors_monthly_volume["Script Date Month"] >= "2023-01-01"
+    df_external_doctors_monthly_volume["Script Period"] >= 2023 * 12 + 1
 ]
-df_external_doctors_monthly_volume_2023["Month"] = (
-    df_external_doctors_monthly_volume_2023["Script Date Month"].dt.month
-)
 df_external_doctors_monthly_volume_only = (
-    df_external_doctors_monthly_volume_2023.groupby(["Month", "Doctor"])["Sctno"]
+    df_external_doctors_monthly_volume_2023.groupby(["Doctor", "Script Month"])[
+        "Sctno"
+    ]
     .mean()
     .reset_index()
 )
-df_external_doctors_monthly_volume_only[
-    "Month"
-] = df_external_doctors_monthly_volume_only["Month"].replace(
-    {
-        1: "Jan",
-        2: "Feb",
-        3: "Mar",
-        4: "Apr",
-        5: "May",
-        6: "Jun",
-        7: "Jul",
-        8: "Aug",
-        9: "Sep",
-        10: "Oct",
-        11: "Nov",
-        12: "Dec",
-    }
+df_external_doctors_monthly_volume_only["Month"] = month_label(
+    df_external_doctors_monthly_volume_only["Script Month"]
 )
-fig = px.line(
+fig = charts.line(
     df_external_doctors_monthly_volume_only,
     x="Month",
     y="Sctno",
     color="Doctor",
+    category_orders={"Month": MONTH_NAMES},
     title="Monthly Script Volumes for Top 5 External Doctors in 2023",
 )
 st.plotly_chart(fig, use_container_width=True)
 
 
 krmc_doctor = st.selectbox("Select KRMC Doctor", krmc_doctors)
-# Top 5 Products for Each Doctor
-df_krmc_doctors = df[df["Doctor"] == krmc_doctor]
-df_krmc_doctors_top_5 = (
-    df_krmc_doctors.groupby(["Doctor", "Item Description"])["Sctno"]
-    .count()
-    .reset_index()
-)
-doctor_items_dict = {}
-for doctor in krmc_doctors:
-    temp_df = df_krmc_doctors_top_5[df_krmc_doctors_top_5["Doctor"] == doctor]
-    temp_df = (
-        temp_df.groupby("Item Description")["Sctno"]
+
+
+# Top 5 Products for the selected Doctor
+def krmc_doctor_top_5():
+    df_krmc_doctors = df_doctor_item_months[
+        df_doctor_item_months["Doctor"] == krmc_doctor
+    ]
+    return (
+        df_krmc_doctors.groupby("Item Description")["Sctno"]
         .sum()
         .sort_values(ascending=False)
         .head(5)
         .reset_index()
     )
-    doctor_items_dict[doctor] = temp_df["Item Description"].tolist()
 
-df_int_docs_ma = df_fa[df_fa["Doctor"].isin(krmc_doctors)]
-df_int_docs_ma["Script Date Month"] = (
-    pd.to_datetime(df_int_docs_ma["Script Date"]).dt.to_period("M").astype(str)
-)
-df_int_docs_ma = (
-    df_int_docs_ma.groupby(["Script Date Month", "Doctor", "Item Description"])["Sctno"]
-    .count()
-    .reset_index()
-)
-df_int_docs_ma["Script Date Month"] = pd.to_datetime(
-    df_int_docs_ma["Script Date Month"]
-)
-df_int_docs_ma["Month"] = df_int_docs_ma["Script Date Month"].dt.month
-df_int_docs_ma = (
-    df_int_docs_ma.groupby(["Month", "Doctor", "Item Description"])["Sctno"]
-    .mean()
-    .reset_index()
-    .sort_values(by=["Doctor", "Month"])
-)
-df_int_docs_ma["Month"] = df_int_docs_ma["Month"].replace(
-    {
-        1: "Jan",
-        2: "Feb",
-        3: "Mar",
-        4: "Apr",
-        5: "May",
-        6: "Jun",
-        7: "Jul",
-        8: "Aug",
-        9: "Sep",
-        10: "Oct",
-        11: "Nov",
-        12: "Dec",
-    }
-)
 
-temp_df = df_int_docs_ma[df_int_docs_ma["Doctor"] == krmc_doctor]
-temp_df = temp_df.groupby(["Item Description", "Month"])["Sctno"].sum().reset_index()
-temp_df = temp_df[
-    temp_df["Item Description"].isin(doctor_items_dict.get(krmc_doctor, []))
-]
-temp_df["Month"] = pd.Categorical(
-    temp_df["Month"],
-    categories=[
-        "Jan",
-        "Feb",
-        "Mar",
-        "Apr",
-        "May",
-        "Jun",
-        "Jul",
-        "Aug",
-        "Sep",
-        "Oct",
-        "Nov",
-        "Dec",
-    ],
-    ordered=True,
-)
-fig = px.line(
-    temp_df.sort_values(by=["Month"]),
-    x="Month",
-    y="Sctno",
-    color="Item Description",
-    title=f"Top 5 Products by Month for {krmc_doctor}",
+def build_doctor_top_5_by_month():
+    top_5_items = krmc_doctor_top_5()["Item Description"].tolist()
+
+    df_int_docs_ma = df_doctor_item_months[
+        df_doctor_item_months["Doctor"] == krmc_doctor
+    ]
+    temp_df = (
+        df_int_docs_ma.groupby(["Item Description", "Script Month"])["Sctno"]
+        .mean()
+        .reset_index()
+    )
+    temp_df = temp_df[temp_df["Item Description"].isin(top_5_items)]
+    temp_df = temp_df.sort_values(by=["Script Month"])
+    temp_df["Month"] = month_label(temp_df["Script Month"])
+    return charts.line(
+        temp_df,
+        x="Month",
+        y="Sctno",
+        color="Item Description",
+        category_orders={"Month": MONTH_NAMES},
+        title=f"Top 5 Products by Month for {krmc_doctor}",
+    )
+
+
+fig = cached_figure(
+    "doctor_top_5_by_month", (krmc_doctor,), build_doctor_top_5_by_month
 )
 st.plotly_chart(fig, use_container_width=True)
 
-df_krmc_doctors_top_5 = (
-    df_krmc_doctors.groupby(["Doctor", "Item Description"])["Sctno"]
-    .count()
-    .reset_index()
-)
 
-temp_df = df_krmc_doctors_top_5[df_krmc_doctors_top_5["Doctor"] == krmc_doctor]
-temp_df = (
-    temp_df.groupby("Item Description")["Sctno"]
-    .sum()
-    .sort_values(ascending=False)
-    .head(5)
-    .reset_index()
-)
-fig = px.bar(
-    temp_df.sort_values(by="Sctno", ascending=False),
-    y="Sctno",
-    x="Item Description",
-    title=f"Top 5 Products by Scipt Volume for {krmc_doctor}",
-)
-fig.update_layout(xaxis_title="Script Volume")
+def build_doctor_top_5_volume():
+    fig = charts.bar(
+        krmc_doctor_top_5(),
+        y="Sctno",
+        x="Item Description",
+        title=f"Top 5 Products by Scipt Volume for {krmc_doctor}",
+    )
+    fig.update_layout(xaxis_title="Script Volume")
+    return fig
+
+
+fig = cached_figure("doctor_top_5_volume", (krmc_doctor,), build_doctor_top_5_volume)
 st.plotly_chart(fig, use_container_width=True)
 
 
@@ -800,3 +875,12 @@ st.markdown(
 This dashboard provides a comprehensive analysis of the KRMC Pharmacy Data, showcasing sales distribution, profit margins, and performance by sectors and doctors over time.
 """
 )
+
+figure_cache_stats = get_figure_cache().stats()
+st.sidebar.caption(
+    f"Figure cache: {figure_cache_stats['hits']} hits, "
+    f"{figure_cache_stats['misses']} misses, "
+    f"{figure_cache_stats['entries']} entries, "
+    f"{figure_cache_stats['bytes'] / 2**20:.1f}"
+    f"/{figure_cache_stats['max_bytes'] / 2**20:.0f} MB"
+)
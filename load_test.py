@@ -0,0 +1,199 @@
+"""Load test for the dashboard's widget interactions.
+
+Drives N simulated sessions against eda_streamlit.py with Streamlit's
+AppTest. Each session logs in through check_password with a test secret and
+then replays a random sequence of widget changes. Latency percentiles and
+peak RSS are reported for each concurrency level.
+
+AppTest swaps process-wide globals (the runtime, st.secrets, the cache
+storage manager) on every run, so each session runs in its own spawned
+process. The sessions compete for CPU like concurrent users of one server
+do, but each process keeps its own st.cache_resource caches (aggregates
+and figures). The latencies are therefore those of a server that has
+warmed up once per session, and the reported memory is per session
+process rather than for one shared server. Every level starts fresh
+processes, so its peak RSS is not carried over from earlier levels.
+
+Run from the directory holding the data file:
+
+    python load_test.py --concurrency 1 2 4 8 --interactions 20
+"""
+
+import argparse
+import multiprocessing
+import random
+import resource
+import sys
+import time
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = "eda_streamlit.py"
+TEST_SECRET = "load-test-secret"
+
+ROLLING_WINDOW_LABELS = [
+    "Enter the rolling window for moving average",
+    "Enter the rolling window for moving average for Number of Scripts per Day",
+    "Enter the rolling window for moving average for Gross Profit by Doctor",
+]
+ITEM_LABEL = "Select Product"
+MEDICAL_AID_LABEL = "Select Medical Aid"
+KRMC_DOCTOR_LABEL = "Select KRMC Doctor"
+
+
+def widget(widgets, label):
+    """Returns the widget in `widgets` with the given label."""
+    return next(w for w in widgets if w.label == label)
+
+
+def log_in(at):
+    """Runs the app and logs in through check_password."""
+    at.secrets["password"] = TEST_SECRET
+    at.run()
+    at.text_input(key="password").input(TEST_SECRET).run()
+    if at.exception:
+        raise RuntimeError(f"App raised during login: {at.exception[0].message}")
+    if not at.session_state["password_correct"]:
+        raise RuntimeError("Login through check_password failed")
+
+
+def interact(at, rng):
+    """Applies one random widget change and reruns the app."""
+    action = rng.choice(["rolling_window", "item", "medical_aid", "krmc_doctor"])
+    if action == "rolling_window":
+        label = rng.choice(ROLLING_WINDOW_LABELS)
+        widget(at.number_input, label).set_value(rng.randint(1, 90))
+    elif action == "item":
+        # Products are listed by volume; managers mostly look at the top ones.
+        selectbox = widget(at.selectbox, ITEM_LABEL)
+        selectbox.set_value(rng.choice(selectbox.options[:50]))
+    elif action == "medical_aid":
+        selectbox = widget(at.selectbox, MEDICAL_AID_LABEL)
+        selectbox.set_value(rng.choice(selectbox.options[:20]))
+    else:
+        selectbox = widget(at.selectbox, KRMC_DOCTOR_LABEL)
+        selectbox.set_value(rng.choice(selectbox.options))
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"App raised after {action}: {at.exception[0].message}")
+
+
+def run_session(session_id, interactions, seed, timeout, barrier):
+    """Logs in and replays `interactions` widget changes.
+
+    Waits on `barrier` after logging in so that every session of a level
+    interacts at the same time. Returns the latency of each interaction in
+    seconds.
+    """
+    rng = random.Random(seed + session_id)
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    log_in(at)
+    barrier.wait()
+    latencies = []
+    for _ in range(interactions):
+        start = time.perf_counter()
+        interact(at, rng)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    if sys.platform == "darwin":
+        return peak / 1024 / 1024
+    return peak / 1024
+
+
+def session_process(session_id, interactions, seed, timeout, barrier, results):
+    """Process entry point: runs one session and reports through `results`."""
+    try:
+        latencies = run_session(session_id, interactions, seed, timeout, barrier)
+        results.put((session_id, latencies, peak_rss_mb(), None))
+    except Exception as e:
+        # Release the other sessions instead of leaving them at the barrier.
+        barrier.abort()
+        results.put((session_id, None, None, repr(e)))
+
+
+def run_level(concurrency, interactions, seed, timeout):
+    """Runs `concurrency` sessions at once and summarises their latencies."""
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(concurrency)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=session_process,
+            args=(session_id, interactions, seed, timeout, barrier, results),
+        )
+        for session_id in range(concurrency)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        reports = [results.get(timeout=timeout * (interactions + 2)) for _ in processes]
+    finally:
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    errors = [f"session {i}: {error}" for i, _, _, error in reports if error]
+    if errors:
+        raise RuntimeError("; ".join(errors))
+    latencies = np.concatenate([latencies for _, latencies, _, _ in reports])
+    peak_rss = [rss for _, _, rss, _ in reports]
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        "concurrency": concurrency,
+        "interactions": len(latencies),
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "max_session_rss_mb": max(peak_rss),
+        "total_rss_mb": sum(peak_rss),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8],
+        help="Numbers of simultaneous sessions to test",
+    )
+    parser.add_argument(
+        "--interactions",
+        type=int,
+        default=20,
+        help="Widget changes replayed by each session",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=300,
+        help="Seconds allowed for a single script run",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'sessions':>8} {'runs':>6} {'p50 ms':>9} {'p95 ms':>9} "
+        f"{'p99 ms':>9} {'max RSS MB':>11} {'total RSS MB':>13}"
+    )
+    for concurrency in args.concurrency:
+        result = run_level(concurrency, args.interactions, args.seed, args.timeout)
+        print(
+            f"{result['concurrency']:>8} {result['interactions']:>6} "
+            f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} "
+            f"{result['p99_ms']:>9.1f} {result['max_session_rss_mb']:>11.1f} "
+            f"{result['total_rss_mb']:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
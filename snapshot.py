@@ -0,0 +1,148 @@
+"""Versioned on-disk snapshots of the dashboard's derived tables.
+
+A snapshot is a directory with one uncompressed Arrow IPC file per table and
+a manifest. The directory is named after a hash of the source data and the
+pipeline version, so a changed source file or aggregation pipeline never
+reuses a stale snapshot. Tables are memory-mapped when the snapshot is
+opened and their pages are only read when a table is used.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import pyarrow as pa
+
+MANIFEST = "manifest.json"
+SOURCE_HASHES = "source_hashes.json"
+
+
+def source_hash(path, chunk_size=1 << 20):
+    """SHA-256 of the file at `path`, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_source_hash(root, path):
+    """SHA-256 of `path`, re-read only when its size or mtime changes.
+
+    The hash is kept with the file's `(st_size, st_mtime_ns)` in a sidecar
+    file under `root`, so a restart with an unchanged source does not read
+    the source at all.
+    """
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    sidecar = os.path.join(root, SOURCE_HASHES)
+    try:
+        with open(sidecar) as f:
+            hashes = json.load(f)
+    except (OSError, ValueError):
+        hashes = {}
+    entry = hashes.get(key)
+    if entry and (entry["size"], entry["mtime_ns"]) == (
+        stat.st_size,
+        stat.st_mtime_ns,
+    ):
+        return entry["sha256"]
+
+    source = source_hash(path)
+    hashes[key] = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": source,
+    }
+    os.makedirs(root, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=root, prefix=".tmp-")
+    with os.fdopen(fd, "w") as f:
+        json.dump(hashes, f, indent=2)
+    os.replace(tmp_path, sidecar)
+    return source
+
+
+def snapshot_path(root, source, pipeline_version):
+    return os.path.join(root, f"{source[:16]}-v{pipeline_version}")
+
+
+class Snapshot:
+    """Memory-mapped tables of one snapshot directory."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+        self.source = manifest["source"]
+        self.pipeline_version = manifest["pipeline_version"]
+        self.metadata = manifest["metadata"]
+        # Reading a memory-mapped IPC file is zero-copy, so this only maps
+        # the files; pages are loaded when a table is converted.
+        self._tables = {
+            name: pa.ipc.open_file(
+                pa.memory_map(os.path.join(path, f"{name}.arrow"))
+            ).read_all()
+            for name in manifest["tables"]
+        }
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        """Returns table `name` as a new DataFrame the caller may modify."""
+        return self._tables[name].to_pandas()
+
+    def shared(self, name):
+        """Returns table `name` as a DataFrame converted once per snapshot.
+
+        Every session gets the same frame, so callers must not modify it.
+        Use this for large tables that are only read.
+        """
+        with self._lock:
+            if name not in self._frames:
+                self._frames[name] = self._tables[name].to_pandas()
+            return self._frames[name]
+
+
+def load_snapshot(root, source, pipeline_version):
+    """Opens the snapshot for `source` and `pipeline_version`, if one exists."""
+    path = snapshot_path(root, source, pipeline_version)
+    if not os.path.exists(os.path.join(path, MANIFEST)):
+        return None
+    return Snapshot(path)
+
+
+def save_snapshot(root, source, pipeline_version, tables, metadata=None):
+    """Writes `tables` (name to DataFrame) as a snapshot and opens it.
+
+    The snapshot is written to a temporary directory and renamed into place,
+    so readers never see a partial snapshot. If another process finished the
+    same snapshot first, its copy is kept.
+    """
+    os.makedirs(root, exist_ok=True)
+    path = snapshot_path(root, source, pipeline_version)
+    tmp_path = tempfile.mkdtemp(dir=root, prefix=".tmp-")
+    try:
+        for name, frame in tables.items():
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            with pa.OSFile(os.path.join(tmp_path, f"{name}.arrow"), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+        manifest = {
+            "source": source,
+            "pipeline_version": pipeline_version,
+            "tables": list(tables),
+            "metadata": metadata or {},
+        }
+        with open(os.path.join(tmp_path, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(tmp_path, path)
+    except OSError:
+        if not os.path.exists(os.path.join(path, MANIFEST)):
+            raise
+    finally:
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+    return Snapshot(path)